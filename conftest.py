@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Shared fixtures for the backend tests: the app runs against a fresh SQLite
+database in a temporary directory, with the Redis cache disabled
+"""
+
+import importlib
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    """Import the app once, creating its database in a temporary directory"""
+    previous_cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("db"))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        main = importlib.import_module("main")
+        main.redis_client = None
+        yield main
+    finally:
+        os.chdir(previous_cwd)
+
+
+@pytest.fixture
+def client(main_module):
+    """Test client over an emptied database, so every test sees only its own data"""
+    with main_module.engine.begin() as conn:
+        conn.execute(delete(main_module.Book))
+        conn.execute(delete(main_module.User))
+    return TestClient(main_module.app)
+
+
+@pytest.fixture
+def create_user_with_books(client):
+    """Create a user and bulk-add one book per (title, genre, rating) entry"""
+    def create(name, books):
+        response = client.post("/users/", json={"name": name})
+        assert response.status_code == 200
+        user_id = response.json()["id"]
+        payload = [
+            {"title": title, "author": "Author", "genre": genre, "rating": rating}
+            for title, genre, rating in books
+        ]
+        response = client.post(f"/books/bulk?user_id={user_id}", json=payload)
+        assert response.status_code == 200
+        assert response.json()["count"] == len(payload)
+        book_ids = [book["id"] for book in client.get(f"/users/{user_id}/books?limit=500").json()]
+        return user_id, book_ids
+    return create
@@ -1,26 +1,90 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, text
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import (
+    create_engine, event, insert, update, select, union_all, exists, literal,
+    Column, Integer, String, JSON, ForeignKey, Index, case, text, func,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
-from pydantic import BaseModel
+from sqlalchemy.orm import sessionmaker, Session, relationship, raiseload, aliased
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 import sqlite3
-from collections import Counter
+from functools import wraps
+import contextvars
 import os
+import json
+import redis
 
 # Database setup
 DATABASE_URL = "sqlite:///./book_recommendations.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Set DEV_MODE=1 to make any accidental lazy load raise instead of issuing a query
+DEV_MODE = os.getenv("DEV_MODE") == "1"
+# Size the pool for FastAPI's threadpool and drop stale connections before use
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": 30},
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=3600,
+    pool_pre_ping=True,
+)
+
+# WAL lets readers proceed while a write is in progress
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+event.listen(engine, "connect", set_sqlite_pragmas)
+
+# Per-request SQL statement counter. The context var holds a one-item list rather
+# than an int because sync handlers run in threadpool copies of the request's
+# context, where a ContextVar.set() would not be seen by the middleware.
+sql_count = contextvars.ContextVar("sql_count", default=None)
+# Requests issuing more statements than this are logged as likely N+1 regressions
+SQL_COUNT_WARN_THRESHOLD = 10
+
+def count_sql_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = sql_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+event.listen(engine, "before_cursor_execute", count_sql_statement)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Cache for read-heavy endpoints; disabled unless REDIS_URL is set
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_TTL_SECONDS = 300
+# Short socket timeouts so an unresponsive Redis costs a fast cache miss
+# instead of holding a threadpool worker until the OS gives up
+REDIS_TIMEOUT_SECONDS = 0.5
+redis_client = redis.Redis.from_url(
+    REDIS_URL,
+    socket_connect_timeout=REDIS_TIMEOUT_SECONDS,
+    socket_timeout=REDIS_TIMEOUT_SECONDS,
+) if REDIS_URL else None
+
+# Upper bound on the number of similar users considered for collaborative filtering
+MAX_SIMILAR_USERS = 20
+# Number of books returned by the recommendations endpoint
+MAX_RECOMMENDATIONS = 5
+# Page sizes for the paginated list endpoints
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
 # Database Models
 class User(Base):
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
+    # Read-book counts per genre and the most read genre, kept up to date by
+    # mark_book_as_read so stats and recommendations don't re-aggregate books
+    favorite_genre = Column(String)
+    genre_counts = Column(JSON, default=dict)
     books = relationship("Book", back_populates="user")
 
 class Book(Base):
@@ -28,6 +92,7 @@ class Book(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
+    title_lower = Column(String)  # title.lower(), for case-insensitive matching
     author = Column(String)
     genre = Column(String, index=True)
     cover_url = Column(String)
@@ -36,10 +101,21 @@ class Book(Base):
     is_read = Column(Integer, default=0)  # 0 = not read, 1 = read
     user = relationship("User", back_populates="books")
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+    # Composite indexes matching the endpoints' query shapes
+    __table_args__ = (
+        # Read books and favorite-genre aggregation per user
+        Index("ix_books_user_isread_genre", "user_id", "is_read", "genre"),
+        # Distinct genres per user for the similarity query
+        Index("ix_books_user_genre", "user_id", "genre"),
+        # Favorite-genre candidates from other users
+        Index("ix_books_genre_user", "genre", "user_id"),
+        # Highly-rated books of similar users
+        Index("ix_books_user_rating", "user_id", "rating"),
+        # "Already read by this user" title exclusion
+        Index("ix_books_title_lower_user_isread", "title_lower", "user_id", "is_read"),
+    )
 
-# Add rating and is_read columns if they don't exist (for existing databases)
+# Add rating, is_read, title_lower and user genre columns if they don't exist (for existing databases)
 def add_missing_columns():
     try:
         with engine.connect() as conn:
@@ -58,11 +134,102 @@ def add_missing_columns():
                 conn.execute(text("ALTER TABLE books ADD COLUMN is_read INTEGER DEFAULT 0"))
                 conn.commit()
                 print("✅ Added is_read column to existing database")
+            
+            if 'title_lower' not in columns:
+                # Add title_lower column
+                conn.execute(text("ALTER TABLE books ADD COLUMN title_lower VARCHAR"))
+                conn.commit()
+                print("✅ Added title_lower column to existing database")
+            
+            # Check if the denormalized genre columns exist on users
+            result = conn.execute(text("PRAGMA table_info(users)"))
+            user_columns = [row[1] for row in result]
+            
+            if 'genre_counts' not in user_columns:
+                conn.execute(text("ALTER TABLE users ADD COLUMN favorite_genre VARCHAR"))
+                conn.execute(text("ALTER TABLE users ADD COLUMN genre_counts JSON"))
+                
+                # Backfill from read books in one pass, tracking each user's top genre
+                # as rows arrive. Rows come in order of each genre's smallest book id,
+                # so ties go to that genre, the same rule as genre_counts_query()
+                genre_stats_by_user = {}
+                rows = conn.execute(text(
+                    "SELECT user_id, genre, COUNT(*) FROM books WHERE is_read = 1 "
+                    "GROUP BY user_id, genre ORDER BY user_id, MIN(id)"
+                ))
+                for user_id, genre, count in rows:
+                    stats = genre_stats_by_user.get(user_id)
+                    if stats is None:
+                        stats = genre_stats_by_user[user_id] = {"genre_counts": {}, "favorite_genre": genre, "best": count}
+                    elif count > stats["best"]:
+                        stats["favorite_genre"], stats["best"] = genre, count
+                    stats["genre_counts"][genre] = count
+                conn.execute(text("UPDATE users SET genre_counts = '{}'"))
+                if genre_stats_by_user:
+                    conn.execute(
+                        text("UPDATE users SET genre_counts = :genre_counts, favorite_genre = :favorite_genre WHERE id = :id"),
+                        [
+                            {
+                                "id": user_id,
+                                "genre_counts": json.dumps(stats["genre_counts"]),
+                                "favorite_genre": stats["favorite_genre"],
+                            }
+                            for user_id, stats in genre_stats_by_user.items()
+                        ]
+                    )
+                conn.commit()
+                print("✅ Added favorite_genre and genre_counts columns to existing database")
+            
+            # Backfill title_lower with Python's lower() so it matches create_book
+            missing = conn.execute(text("SELECT id, title FROM books WHERE title_lower IS NULL")).all()
+            if missing:
+                conn.execute(
+                    text("UPDATE books SET title_lower = :title_lower WHERE id = :id"),
+                    [{"id": book_id, "title_lower": (title or "").lower()} for book_id, title in missing]
+                )
+                conn.commit()
+            
+            # create_all() only creates indexes for new tables
+            existing_indexes = {
+                row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))
+            }
+            new_indexes = [index for index in Book.__table__.indexes if index.name not in existing_indexes]
+            for index in new_indexes:
+                index.create(conn)
+            if new_indexes:
+                # Refresh planner statistics so SQLite picks up the new indexes
+                conn.execute(text("ANALYZE"))
+                print(f"✅ Created {len(new_indexes)} missing indexes")
+            conn.commit()
+        return True
     except Exception as e:
         print(f"Database migration note: {e}")
+        return False
+
+# Bump whenever the models or add_missing_columns() change
+SCHEMA_VERSION = 2
+
+# Create tables and run migrations only when the stored schema version is behind,
+# so an up-to-date database costs one small query at startup
+def migrate_schema():
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_meta (version INTEGER NOT NULL)"))
+        version = conn.execute(text("SELECT MAX(version) FROM schema_meta")).scalar()
+        conn.commit()
+    if version is not None and version >= SCHEMA_VERSION:
+        return
+    
+    # Create tables
+    Base.metadata.create_all(bind=engine)
+    
+    if add_missing_columns():
+        with engine.connect() as conn:
+            conn.execute(text("DELETE FROM schema_meta"))
+            conn.execute(text("INSERT INTO schema_meta (version) VALUES (:version)"), {"version": SCHEMA_VERSION})
+            conn.commit()
 
 # Run migration
-add_missing_columns()
+migrate_schema()
 
 # Pydantic models
 class UserCreate(BaseModel):
@@ -72,8 +239,7 @@ class UserResponse(BaseModel):
     id: int
     name: str
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class BookCreate(BaseModel):
     title: str
@@ -92,8 +258,7 @@ class BookResponse(BaseModel):
     rating: int
     is_read: int
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class UserStatsResponse(BaseModel):
     user: UserResponse
@@ -108,7 +273,11 @@ class RecommendationResponse(BaseModel):
     suggested_books: List[BookResponse]
 
 # FastAPI app
-app = FastAPI(title="Book Recommendation System", version="1.0.0")
+app = FastAPI(
+    title="Book Recommendation System",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
 # CORS middleware
 app.add_middleware(
@@ -120,8 +289,123 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-SQL-Count"],
 )
 
+# Report the number of SQL statements each request issued
+@app.middleware("http")
+async def sql_count_middleware(request, call_next):
+    counter = [0]
+    token = sql_count.set(counter)
+    try:
+        response = await call_next(request)
+    finally:
+        sql_count.reset(token)
+    response.headers["X-SQL-Count"] = str(counter[0])
+    if counter[0] > SQL_COUNT_WARN_THRESHOLD:
+        print(f"⚠️ {request.method} {request.url.path} issued {counter[0]} SQL statements")
+    return response
+
+
+# Loader options appended to ORM queries; in dev mode every relationship that was
+# not explicitly eager-loaded raises on access so N+1 patterns surface early
+def dev_loader_options():
+    return [raiseload("*")] if DEV_MODE else []
+
+# Count books per genre in SQL, most common first; ties go to the genre seen first
+def genre_counts_query(db: Session, *criteria):
+    return db.query(Book.genre, func.count().label("c")).filter(*criteria).group_by(
+        Book.genre
+    ).order_by(func.count().desc(), func.min(Book.id))
+
+# Send an already-serialized JSON body as is
+def json_response(body):
+    return Response(content=body, media_type="application/json")
+
+# Serve a per-user endpoint from Redis, falling back to the handler on a miss.
+# Each user has one hash per endpoint with a field per query-parameter variant,
+# so invalidation only needs to delete the hash. The TTL is set only when the
+# hash is created, so no field outlives CACHE_TTL_SECONDS.
+# The handler's model is serialized once by pydantic-core and returned as a raw
+# Response, so FastAPI does not validate it a second time against response_model;
+# cache hits are sent as stored without being parsed.
+def cached(prefix):
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(user_id: int, db: Session, **params):
+            if redis_client is None:
+                return json_response(handler(user_id, db=db, **params).model_dump_json())
+            key = f"{prefix}:{user_id}"
+            field = "&".join(f"{name}={value}" for name, value in sorted(params.items()))
+            try:
+                hit = redis_client.hget(key, field)
+                if hit is not None:
+                    return json_response(hit)
+            except redis.RedisError as e:
+                print(f"Cache read failed for {key}: {e}")
+            
+            body = handler(user_id, db=db, **params).model_dump_json()
+            try:
+                pipe = redis_client.pipeline()
+                pipe.hset(key, field, body)
+                pipe.expire(key, CACHE_TTL_SECONDS, nx=True)
+                pipe.execute()
+            except redis.RedisError as e:
+                print(f"Cache write failed for {key}: {e}")
+            return json_response(body)
+        return wrapper
+    return decorator
+
+# Drop cached stats/recommendations after a user's books change
+def invalidate_user_cache(user_id: int):
+    if redis_client is None:
+        return
+    try:
+        redis_client.delete(f"stats:{user_id}", f"recs:{user_id}")
+    except redis.RedisError as e:
+        print(f"Cache invalidation failed for user {user_id}: {e}")
+
+# Column values for a newly added book, shared by single and bulk inserts
+def new_book_values(book: BookCreate, user_id: int):
+    # Validate rating
+    rating = book.rating or 0
+    if rating < 0 or rating > 5:
+        rating = 0
+    
+    return dict(
+        title=book.title,
+        title_lower=book.title.lower(),
+        author=book.author,
+        genre=book.genre,
+        cover_url=book.cover_url,
+        user_id=user_id,
+        rating=rating,
+        is_read=0  # New books are not read by default
+    )
+
+# Columns returned for each book, in BookResponse field order
+BOOK_COLUMNS = (
+    Book.id, Book.title, Book.author, Book.genre, Book.cover_url,
+    Book.user_id, Book.rating, Book.is_read
+)
+
+# Serialize list endpoints straight from column rows, skipping ORM objects and
+# per-item Pydantic validation; response_model still documents the shape
+def fetch_rows(db: Session, query):
+    return [dict(row._mapping) for row in db.execute(query)]
+
+def rows_response(db: Session, query):
+    return ORJSONResponse(fetch_rows(db, query))
+
+# Existence check that reads a constant instead of hydrating a User object
+def user_exists(db: Session, user_id: int):
+    return db.execute(select(literal(1)).where(User.id == user_id)).scalar() is not None
+
+# Raise 404 for an unknown user; read endpoints only call this once their main
+# query came back empty, so users with data never pay for the check
+def ensure_user_exists(db: Session, user_id: int):
+    if not user_exists(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
 
 # Dependency to get database session
 def get_db():
@@ -132,15 +416,17 @@ def get_db():
         db.close()
 
 # API Endpoints
+# Handlers that use the (synchronous) database session are plain `def` so FastAPI
+# runs them in its threadpool instead of blocking the event loop on each query
 @app.get("/")
 async def root():
     return {"message": "Book Recommendation System API"}
 
 @app.post("/users/", response_model=UserResponse)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+def create_user(user: UserCreate, db: Session = Depends(get_db)):
     # Check if user already exists
-    existing_user = db.query(User).filter(User.name == user.name).first()
-    if existing_user:
+    existing_user = db.execute(select(literal(1)).where(User.name == user.name)).scalar()
+    if existing_user is not None:
         raise HTTPException(status_code=400, detail="User already exists")
     
     db_user = User(name=user.name)
@@ -150,78 +436,104 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 @app.get("/users/", response_model=List[UserResponse])
-async def get_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    return users
+def get_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after_id: int = 0,
+    db: Session = Depends(get_db)
+):
+    # Keyset pagination: pass the last id of a page as after_id to get the next one
+    return rows_response(
+        db, select(User.id, User.name).where(User.id > after_id).order_by(User.id).limit(limit)
+    )
 
 @app.get("/users/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+def get_user(user_id: int, db: Session = Depends(get_db)):
+    user = db.query(User).options(*dev_loader_options()).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @app.post("/books/", response_model=BookResponse)
-async def create_book(book: BookCreate, user_id: int, db: Session = Depends(get_db)):
+def create_book(book: BookCreate, user_id: int, db: Session = Depends(get_db)):
     try:
         # Check if user exists
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        ensure_user_exists(db, user_id)
         
-        # Validate rating
-        rating = book.rating or 0
-        if rating < 0 or rating > 5:
-            rating = 0
-        
-        db_book = Book(
-            title=book.title,
-            author=book.author,
-            genre=book.genre,
-            cover_url=book.cover_url,
-            user_id=user_id,
-            rating=rating,
-            is_read=0  # New books are not read by default
-        )
+        db_book = Book(**new_book_values(book, user_id))
         db.add(db_book)
         db.commit()
         db.refresh(db_book)
+        invalidate_user_cache(user_id)
         return db_book
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         print(f"Error creating book: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create book: {str(e)}")
 
+@app.post("/books/bulk")
+def create_books_bulk(books: List[BookCreate], user_id: int, db: Session = Depends(get_db)):
+    ensure_user_exists(db, user_id)
+    
+    if not books:
+        return {"message": "No books to add", "count": 0}
+    
+    try:
+        # One executemany INSERT in a single transaction instead of a commit per book
+        db.execute(insert(Book), [new_book_values(book, user_id) for book in books])
+        db.commit()
+        invalidate_user_cache(user_id)
+        return {"message": f"Added {len(books)} books", "count": len(books)}
+    except Exception as e:
+        db.rollback()
+        print(f"Error creating books: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to create books: {str(e)}")
+
 @app.get("/users/{user_id}/books", response_model=List[BookResponse])
-async def get_user_books(user_id: int, db: Session = Depends(get_db)):
+def get_user_books(
+    user_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after_id: int = 0,
+    db: Session = Depends(get_db)
+):
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        books = db.query(Book).filter(Book.user_id == user_id).all()
-        return books
+        # A page is capped at MAX_PAGE_SIZE rows, so fetch it in a single query
+        books = fetch_rows(
+            db,
+            select(*BOOK_COLUMNS)
+            .where(Book.user_id == user_id, Book.id > after_id)
+            .order_by(Book.id)
+            .limit(limit)
+        )
+        if not books:
+            ensure_user_exists(db, user_id)
+        return ORJSONResponse(books)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching user books: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch books: {str(e)}")
 
 @app.get("/users/{user_id}/read-books", response_model=List[BookResponse])
-async def get_user_read_books(user_id: int, db: Session = Depends(get_db)):
+def get_user_read_books(user_id: int, db: Session = Depends(get_db)):
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        read_books = db.query(Book).filter(Book.user_id == user_id, Book.is_read == 1).all()
-        return read_books
+        read_books = fetch_rows(
+            db, select(*BOOK_COLUMNS).where(Book.user_id == user_id, Book.is_read == 1).order_by(Book.id)
+        )
+        if not read_books:
+            ensure_user_exists(db, user_id)
+        return ORJSONResponse(read_books)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching read books: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch read books: {str(e)}")
 
 @app.put("/books/{book_id}/mark-read")
-async def mark_book_as_read(book_id: int, rating: int, db: Session = Depends(get_db)):
+def mark_book_as_read(book_id: int, rating: int, db: Session = Depends(get_db)):
     try:
-        book = db.query(Book).filter(Book.id == book_id).first()
+        book = db.query(Book).options(*dev_loader_options()).filter(Book.id == book_id).first()
         if not book:
             raise HTTPException(status_code=404, detail="Book not found")
         
@@ -229,26 +541,55 @@ async def mark_book_as_read(book_id: int, rating: int, db: Session = Depends(get
         if rating < 1 or rating > 5:
             raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
         
-        book.is_read = 1
-        book.rating = rating
+        # Flip the flag only if the book is still unread, so concurrent requests
+        # for the same book count it once; the UPDATE also opens the write
+        # transaction that serializes the recount below
+        newly_read = db.execute(
+            update(Book)
+            .where(Book.id == book_id, Book.is_read == 0)
+            .values(is_read=1, rating=rating)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+        if newly_read:
+            # Recount the owner's read genres rather than incrementing the stored
+            # JSON, which would lose updates made by concurrent requests
+            genre_counts = dict(genre_counts_query(db, Book.user_id == book.user_id, Book.is_read == 1).all())
+            db.execute(
+                update(User)
+                .where(User.id == book.user_id)
+                .values(genre_counts=genre_counts, favorite_genre=next(iter(genre_counts)))
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            # Already read: only the rating changes
+            db.execute(
+                update(Book)
+                .where(Book.id == book_id)
+                .values(rating=rating)
+                .execution_options(synchronize_session=False)
+            )
         db.commit()
+        invalidate_user_cache(book.user_id)
         
         return {"message": f"Book '{book.title}' marked as read with rating {rating}"}
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         print(f"Error marking book as read: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to mark book as read: {str(e)}")
 
 @app.get("/users/{user_id}/stats", response_model=UserStatsResponse)
-async def get_user_stats(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+@cached("stats")
+def get_user_stats(user_id: int, include_books: bool = True, db: Session = Depends(get_db)):
+    user = db.query(User).options(*dev_loader_options()).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Only count read books for statistics
-    read_books = db.query(Book).filter(Book.user_id == user_id, Book.is_read == 1).all()
-    
-    if not read_books:
+    # Genre counts only cover read books and are maintained on the user row
+    genre_counts = user.genre_counts or {}
+    if not genre_counts:
         return UserStatsResponse(
             user=user,
             total_books=0,
@@ -257,37 +598,38 @@ async def get_user_stats(user_id: int, db: Session = Depends(get_db)):
             books=[]
         )
     
-    # Analyze genre preferences from read books only
-    genres = [book.genre for book in read_books]
-    genre_counts = dict(Counter(genres))
-    favorite_genre = max(genre_counts, key=genre_counts.get)
+    read_books = []
+    if include_books:
+        read_books = db.execute(
+            select(*BOOK_COLUMNS).where(Book.user_id == user_id, Book.is_read == 1).order_by(Book.id)
+        ).mappings().all()
     
     return UserStatsResponse(
         user=user,
-        total_books=len(read_books),
-        favorite_genre=favorite_genre,
+        total_books=sum(genre_counts.values()),
+        favorite_genre=user.favorite_genre,
         genre_counts=genre_counts,
         books=read_books
     )
 
 @app.get("/users/{user_id}/recommendations", response_model=RecommendationResponse)
-async def get_recommendations(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+@cached("recs")
+def get_recommendations(user_id: int, db: Session = Depends(get_db)):
+    user = db.query(User).options(*dev_loader_options()).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Step 1: Identify books already read by the user
-    user_read_books = db.query(Book).filter(Book.user_id == user_id, Book.is_read == 1).all()
-    user_book_titles = {book.title.lower() for book in user_read_books}
+    # Step 1: Determine the user's favorite genre from past reads
+    genre_counts = user.genre_counts or {}
     
-    if not user_read_books:
+    if not genre_counts:
         # If no books, recommend popular genres
-        all_books = db.query(Book).all()
-        if all_books:
-            all_genres = [book.genre for book in all_books]
-            genre_counts = dict(Counter(all_genres))
-            recommended_genre = max(genre_counts, key=genre_counts.get)
-            suggested_books = db.query(Book).filter(Book.genre == recommended_genre).limit(5).all()
+        popular_genre = genre_counts_query(db).first()
+        if popular_genre:
+            recommended_genre = popular_genre.genre
+            suggested_books = db.execute(
+                select(*BOOK_COLUMNS).where(Book.genre == recommended_genre).limit(MAX_RECOMMENDATIONS)
+            ).mappings().all()
             
             return RecommendationResponse(
                 recommended_genre=recommended_genre,
@@ -301,91 +643,84 @@ async def get_recommendations(user_id: int, db: Session = Depends(get_db)):
                 suggested_books=[]
             )
     
-    # Step 2: Determine the user's favorite genre from past reads
-    user_genres = [book.genre for book in user_read_books]
-    genre_counts = dict(Counter(user_genres))
-    favorite_genre = max(genre_counts, key=genre_counts.get)
-    
-    # Step 3: Suggest books in favorite genre the user hasn't read yet
-    content_based_books = db.query(Book).filter(
-        Book.genre == favorite_genre,
-        Book.user_id != user_id,  # Books from other users
-        ~Book.title.in_(user_book_titles)
-    ).all()
-    
-    # Step 4: Recommend books read by similar users (collaborative filtering)
-    collaborative_books = []
-    
-    # Find users with similar reading patterns
-    all_users = db.query(User).filter(User.id != user_id).all()
-    similar_users = []
-    
-    for other_user in all_users:
-        other_user_books = db.query(Book).filter(Book.user_id == other_user.id).all()
-        if not other_user_books:
-            continue
-            
-        # Calculate similarity based on genre overlap
-        other_genres = [book.genre for book in other_user_books]
-        other_genre_counts = dict(Counter(other_genres))
-        
-        # Calculate Jaccard similarity for genres
-        user_genre_set = set(genre_counts.keys())
-        other_genre_set = set(other_genre_counts.keys())
-        
-        if user_genre_set and other_genre_set:
-            intersection = user_genre_set.intersection(other_genre_set)
-            union = user_genre_set.union(other_genre_set)
-            similarity = len(intersection) / len(union) if union else 0
-            
-            if similarity > 0.3:  # Threshold for similarity
-                similar_users.append((other_user.id, similarity))
-    
-    # Get highly-rated books from similar users
-    for similar_user_id, similarity in similar_users:
-        similar_user_books = db.query(Book).filter(
-            Book.user_id == similar_user_id,
-            Book.rating >= 4,  # Only highly-rated books
-            ~Book.title.in_(user_book_titles)
-        ).all()
-        collaborative_books.extend(similar_user_books)
+    favorite_genre = user.favorite_genre
     
-    # Step 5: Merge results, remove duplicates, and return a list with cover images and ratings
-    all_suggested_books = []
-    
-    # Add content-based recommendations (weighted by genre preference)
-    for book in content_based_books:
-        all_suggested_books.append((book, 1.0))  # Base weight for content-based
-    
-    # Add collaborative recommendations (weighted by similarity)
-    for book in collaborative_books:
-        # Find the similarity score for this book's user
-        book_user_similarity = next((sim for uid, sim in similar_users if uid == book.user_id), 0.5)
-        all_suggested_books.append((book, book_user_similarity))
-    
-    # Remove duplicates and sort by weight
-    seen_books = set()
-    unique_books = []
+    # Step 2: Find users with similar reading patterns (collaborative filtering)
+    # Jaccard similarity over genre sets, computed in one aggregate query:
+    # |shared genres| / (|user genres| + |other user's genres| - |shared genres|)
+    user_genres = list(genre_counts)
+    shared_genres = func.count(func.distinct(case((Book.genre.in_(user_genres), Book.genre))))
+    similarity = (shared_genres * 1.0) / (
+        len(user_genres) + func.count(func.distinct(Book.genre)) - shared_genres
+    )
+    similar_users = dict(
+        db.query(Book.user_id, similarity.label("similarity"))
+        .filter(Book.user_id != user_id)
+        .group_by(Book.user_id)
+        .having(similarity > 0.3)  # Threshold for similarity
+        .order_by(similarity.desc(), Book.user_id)
+        .limit(MAX_SIMILAR_USERS)
+        .all()
+    )
     
-    for book, weight in all_suggested_books:
-        if book.id not in seen_books:
-            seen_books.add(book.id)
-            unique_books.append((book, weight))
+    # Step 3: Build every candidate source as one weighted SELECT, excluding
+    # books whose title the user has already read
+    read_book = aliased(Book)
+    not_read_by_user = ~exists().where(
+        read_book.user_id == user_id,
+        read_book.is_read == 1,
+        read_book.title_lower == Book.title_lower
+    )
     
-    # Sort by weight (similarity + content preference) and rating
-    unique_books.sort(key=lambda x: (x[1], x[0].rating), reverse=True)
+    def candidates(source, weight, *criteria, owner_rank=literal(0)):
+        # Each source only needs its own top picks: anything below that is
+        # outranked by at least as many books in the merged list. Equal weight
+        # and rating fall back to owner_rank (the similar user's id for
+        # collaborative picks, as the original per-user loop ordered them)
+        # and then the book id
+        return select(
+            select(
+                Book, weight.label("weight"), literal(source).label("source"),
+                owner_rank.label("owner_rank")
+            )
+            .where(Book.user_id != user_id, not_read_by_user, *criteria)
+            .order_by(weight.desc(), Book.rating.desc(), owner_rank, Book.id)
+            .limit(MAX_RECOMMENDATIONS)
+            .subquery()
+        )
     
-    # Take top 5 recommendations
-    final_books = [book for book, weight in unique_books[:5]]
+    sources = [
+        # Books in the favorite genre (content-based, base weight)
+        candidates(0, literal(1.0), Book.genre == favorite_genre),
+        # Popular books from any genre, used to fill the list when short
+        candidates(2, literal(-1.0)),
+    ]
+    if similar_users:
+        # Highly-rated books from similar users, weighted by similarity
+        sources.append(candidates(
+            1, case(similar_users, value=Book.user_id, else_=0.5),
+            Book.user_id.in_(similar_users), Book.rating >= 4,
+            owner_rank=Book.user_id
+        ))
+    merged = union_all(*sources).subquery()
     
-    # If not enough recommendations, add popular books from other genres
-    if len(final_books) < 5:
-        remaining_books = db.query(Book).filter(
-            Book.user_id != user_id,
-            ~Book.title.in_(user_book_titles),
-            ~Book.id.in_([book.id for book in final_books])
-        ).order_by(Book.rating.desc()).limit(5 - len(final_books)).all()
-        final_books.extend(remaining_books)
+    # Step 4: Remove duplicates (keeping each book's best weight) and sort by
+    # weight and rating, all in the same statement
+    ranked = select(
+        merged,
+        func.row_number().over(
+            partition_by=merged.c.id, order_by=(merged.c.weight.desc(), merged.c.source)
+        ).label("rn")
+    ).subquery()
+    final_books = db.execute(
+        select(*(ranked.c[column.key] for column in BOOK_COLUMNS))
+        .where(ranked.c.rn == 1)
+        .order_by(
+            ranked.c.weight.desc(), ranked.c.rating.desc(),
+            ranked.c.source, ranked.c.owner_rank, ranked.c.id
+        )
+        .limit(MAX_RECOMMENDATIONS)
+    ).mappings().all()
     
     return RecommendationResponse(
         recommended_genre=favorite_genre,
@@ -394,9 +729,15 @@ async def get_recommendations(user_id: int, db: Session = Depends(get_db)):
     )
 
 @app.get("/books/", response_model=List[BookResponse])
-async def get_all_books(db: Session = Depends(get_db)):
-    books = db.query(Book).all()
-    return books
+def get_all_books(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after_id: int = 0,
+    db: Session = Depends(get_db)
+):
+    # Keyset pagination on the primary key: an index seek instead of an OFFSET scan
+    return rows_response(
+        db, select(*BOOK_COLUMNS).where(Book.id > after_id).order_by(Book.id).limit(limit)
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -9,7 +9,7 @@ import sqlite3
 
 def reset_database():
     """Reset the database to fix schema issues"""
-    db_path = "backend/book_recommendations.db"
+    db_path = "book_recommendations.db"
     
     # Remove existing database
     if os.path.exists(db_path):
@@ -24,7 +24,9 @@ def reset_database():
     cursor.execute('''
         CREATE TABLE users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name VARCHAR UNIQUE NOT NULL
+            name VARCHAR UNIQUE NOT NULL,
+            favorite_genre VARCHAR,
+            genre_counts JSON DEFAULT '{}'
         )
     ''')
     
@@ -33,11 +35,13 @@ def reset_database():
         CREATE TABLE books (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             title VARCHAR NOT NULL,
+            title_lower VARCHAR,
             author VARCHAR NOT NULL,
             genre VARCHAR NOT NULL,
             cover_url VARCHAR,
             user_id INTEGER NOT NULL,
             rating INTEGER DEFAULT 0,
+            is_read INTEGER DEFAULT 0,
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
     ''')
@@ -50,6 +54,14 @@ def reset_database():
     cursor.execute('CREATE INDEX ix_books_genre ON books (genre)')
     cursor.execute('CREATE INDEX ix_books_user_id ON books (user_id)')
     
+    # Composite indexes matching the API's query shapes
+    cursor.execute('CREATE INDEX ix_books_user_isread_genre ON books (user_id, is_read, genre)')
+    cursor.execute('CREATE INDEX ix_books_user_genre ON books (user_id, genre)')
+    cursor.execute('CREATE INDEX ix_books_genre_user ON books (genre, user_id)')
+    cursor.execute('CREATE INDEX ix_books_user_rating ON books (user_id, rating)')
+    cursor.execute('CREATE INDEX ix_books_title_lower_user_isread ON books (title_lower, user_id, is_read)')
+    cursor.execute('ANALYZE')
+    
     conn.commit()
     conn.close()
     
@@ -3,6 +3,19 @@ import axios from 'axios';
 import './App.css';
 
 const API_BASE_URL = 'https://book-recommendation-app-8.onrender.com';
+const PAGE_SIZE = 500;
+
+// List endpoints are paginated by id; follow pages until a short one comes back
+const fetchAllPages = async (url) => {
+  let items = [];
+  let afterId = 0;
+  while (true) {
+    const response = await axios.get(url, { params: { limit: PAGE_SIZE, after_id: afterId } });
+    items = items.concat(response.data);
+    if (response.data.length < PAGE_SIZE) return items;
+    afterId = response.data[response.data.length - 1].id;
+  }
+};
 
 
 function App() {
@@ -50,8 +63,7 @@ function App() {
 
   const fetchUsers = async () => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/users/`);
-      setUsers(response.data);
+      setUsers(await fetchAllPages(`${API_BASE_URL}/users/`));
     } catch (error) {
       setError('Failed to fetch users');
     }
@@ -63,9 +75,9 @@ function App() {
     try {
       setLoading(true);
       console.log('Fetching books for user:', selectedUser);
-      const response = await axios.get(`${API_BASE_URL}/users/${selectedUser}/books`);
-      console.log('Fetched books:', response.data);
-      setBooks(response.data);
+      const userBooks = await fetchAllPages(`${API_BASE_URL}/users/${selectedUser}/books`);
+      console.log('Fetched books:', userBooks);
+      setBooks(userBooks);
     } catch (error) {
       console.error('Error fetching user books:', error);
       setError(`Failed to fetch user books: ${error.response?.data?.detail || error.message}`);
@@ -91,7 +103,7 @@ function App() {
     if (!selectedUser) return;
     
     try {
-      const response = await axios.get(`${API_BASE_URL}/users/${selectedUser}/stats`);
+      const response = await axios.get(`${API_BASE_URL}/users/${selectedUser}/stats?include_books=false`);
       setUserStats(response.data);
     } catch (error) {
       setError('Failed to fetch user statistics');
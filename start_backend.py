@@ -22,8 +22,8 @@ def start_server():
     """Start the FastAPI server"""
     print("Starting FastAPI server...")
     try:
-        # Change to backend directory
-        os.chdir("backend")
+        # Run the app from the project root, where main.py lives
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
         subprocess.run([sys.executable, "main.py"])
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch insert endpoint POST /books/bulk
+Run with: python -m pytest test_books_bulk.py
+"""
+
+
+class RecordingRedis:
+    """Stand-in cache client that records which keys were deleted"""
+
+    def __init__(self):
+        self.deleted = []
+
+    def delete(self, *keys):
+        self.deleted.extend(keys)
+
+
+def test_bulk_insert_adds_rows_and_clamps_ratings(client):
+    user_id = client.post("/users/", json={"name": "bulk"}).json()["id"]
+    books = [
+        {"title": "Dune", "author": "Herbert", "genre": "SF", "rating": 4},
+        {"title": "Emma", "author": "Austen", "genre": "Classic", "rating": 9},
+        {"title": "Ubik", "author": "Dick", "genre": "SF", "rating": -1},
+    ]
+
+    response = client.post(f"/books/bulk?user_id={user_id}", json=books)
+    assert response.status_code == 200
+    assert response.json()["count"] == 3
+
+    # Out-of-range ratings are reset to 0, as for single inserts
+    stored = client.get(f"/users/{user_id}/books").json()
+    assert [(book["title"], book["genre"], book["rating"], book["is_read"]) for book in stored] == [
+        ("Dune", "SF", 4, 0),
+        ("Emma", "Classic", 0, 0),
+        ("Ubik", "SF", 0, 0),
+    ]
+    assert all(book["user_id"] == user_id for book in stored)
+
+
+def test_bulk_insert_empty_list_adds_nothing(client):
+    user_id = client.post("/users/", json={"name": "empty"}).json()["id"]
+
+    response = client.post(f"/books/bulk?user_id={user_id}", json=[])
+    assert response.status_code == 200
+    assert response.json()["count"] == 0
+    assert client.get(f"/users/{user_id}/books").json() == []
+
+
+def test_bulk_insert_unknown_user_returns_404(client):
+    book = {"title": "Dune", "author": "Herbert", "genre": "SF"}
+
+    assert client.post("/books/bulk?user_id=999999", json=[book]).status_code == 404
+    assert client.get("/books/").json() == []
+
+
+def test_bulk_insert_invalidates_user_cache(client, main_module, monkeypatch):
+    user_id = client.post("/users/", json={"name": "cached"}).json()["id"]
+    cache = RecordingRedis()
+    monkeypatch.setattr(main_module, "redis_client", cache)
+
+    book = {"title": "Dune", "author": "Herbert", "genre": "SF"}
+    assert client.post(f"/books/bulk?user_id={user_id}", json=[book]).status_code == 200
+    assert sorted(cache.deleted) == [f"recs:{user_id}", f"stats:{user_id}"]
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the genre statistics kept on the user row by mark-read
+Run with: python -m pytest test_mark_read.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_concurrent_mark_read_keeps_genre_counts(client, create_user_with_books):
+    genres = ["SF", "Mystery", "History", "Poetry"] * 10
+    user_id, book_ids = create_user_with_books(
+        "concurrent", [(f"concurrent book {i}", genre, 0) for i, genre in enumerate(genres)]
+    )
+
+    # Every book twice, so the same book is also marked read concurrently
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        responses = list(pool.map(
+            lambda book_id: client.put(f"/books/{book_id}/mark-read?rating=4"),
+            book_ids * 2
+        ))
+    assert all(response.status_code == 200 for response in responses)
+
+    stats = client.get(f"/users/{user_id}/stats").json()
+    assert stats["total_books"] == len(book_ids)
+    assert stats["genre_counts"] == {"SF": 10, "Mystery": 10, "History": 10, "Poetry": 10}
+    assert stats["favorite_genre"] == "SF"
+
+
+def test_favorite_genre_tie_goes_to_smallest_book_id(client, create_user_with_books):
+    user_id, book_ids = create_user_with_books(
+        "ties", [("ties book 0", "b", 0), ("ties book 1", "d", 0), ("ties book 2", "c", 0)]
+    )
+
+    # Read order must not matter: with equal counts the lowest book id wins
+    for book_id in reversed(book_ids):
+        client.put(f"/books/{book_id}/mark-read?rating=3")
+
+    stats = client.get(f"/users/{user_id}/stats").json()
+    assert stats["favorite_genre"] == "b"
+    assert client.get(f"/users/{user_id}/recommendations").json()["recommended_genre"] == "b"
+
+
+def test_mark_read_errors_keep_their_status_codes(client, create_user_with_books):
+    user_id, book_ids = create_user_with_books("errors", [("errors book 0", "SF", 0)])
+
+    assert client.put("/books/999999/mark-read?rating=3").status_code == 404
+    assert client.put(f"/books/{book_ids[0]}/mark-read?rating=9").status_code == 400
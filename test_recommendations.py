@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the ranking of GET /users/{user_id}/recommendations
+Run with: python -m pytest test_recommendations.py
+"""
+
+
+def create_reader(client, create_user_with_books, name, books):
+    """Create a user whose books are all marked as read"""
+    user_id, book_ids = create_user_with_books(name, books)
+    for book_id in book_ids:
+        assert client.put(f"/books/{book_id}/mark-read?rating=3").status_code == 200
+    return user_id
+
+
+def add_books(client, user_id, books):
+    payload = [
+        {"title": title, "author": "Author", "genre": genre, "rating": rating}
+        for title, genre, rating in books
+    ]
+    assert client.post(f"/books/bulk?user_id={user_id}", json=payload).status_code == 200
+
+
+def suggested_titles(client, user_id):
+    response = client.get(f"/users/{user_id}/recommendations")
+    assert response.status_code == 200
+    return [book["title"] for book in response.json()["suggested_books"]]
+
+
+def test_content_picks_outrank_collaborative_ones(client, create_user_with_books):
+    reader = create_reader(client, create_user_with_books, "reader", [("Dune", "SF", 0)])
+    # Shares one of two genres with the reader: similarity 0.5, below the
+    # content weight of 1.0, so a better-rated collaborative pick still ranks lower
+    create_user_with_books("other", [("Solaris", "SF", 3), ("Rebecca", "Mystery", 5)])
+
+    assert suggested_titles(client, reader) == ["Solaris", "Rebecca"]
+
+
+def test_collaborative_ties_follow_similar_user_id(client, create_user_with_books):
+    reader = create_reader(client, create_user_with_books, "reader", [("Dune", "SF", 0)])
+    first = client.post("/users/", json={"name": "first"}).json()["id"]
+    second = client.post("/users/", json={"name": "second"}).json()["id"]
+    # The second user's books get the lower ids, but equal weight and rating
+    # are ordered by the similar user's id before the book id
+    add_books(client, second, [("Hyperion", "SF", 3), ("Rebecca", "Mystery", 5)])
+    add_books(client, first, [("Solaris", "SF", 2), ("Gaudy Night", "Mystery", 5)])
+
+    assert suggested_titles(client, reader) == ["Hyperion", "Solaris", "Gaudy Night", "Rebecca"]
+
+
+def test_fallback_fills_short_list_without_duplicates(client, create_user_with_books):
+    reader = create_reader(client, create_user_with_books, "reader", [("Dune", "SF", 0)])
+    # Six genres against the reader's one: too dissimilar for collaborative picks,
+    # so only the SF book is a content pick and the rest come from the fallback
+    create_user_with_books("other", [
+        ("Solaris", "SF", 5),
+        ("Rebecca", "Mystery", 5),
+        ("SPQR", "History", 4),
+        ("Ariel", "Poetry", 3),
+        ("Hamlet", "Drama", 2),
+        ("Shane", "Western", 1),
+    ])
+
+    titles = suggested_titles(client, reader)
+    assert titles == ["Solaris", "Rebecca", "SPQR", "Ariel", "Hamlet"]
+    assert len(set(titles)) == len(titles)
+
+
+def test_titles_already_read_are_excluded_case_insensitively(client, create_user_with_books):
+    reader = create_reader(client, create_user_with_books, "reader", [("Dune", "SF", 0)])
+    create_user_with_books("sf fan", [("DUNE", "SF", 5), ("Foundation", "SF", 1)])
+    create_user_with_books("mystery fan", [("dune", "Mystery", 5)])
+
+    assert suggested_titles(client, reader) == ["Foundation"]